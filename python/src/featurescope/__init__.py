@@ -1,5 +1,3 @@
-from ._version import version as __version__
-
 try:
     from ._version import version as __version__
 except ImportError:
@@ -1,20 +1,57 @@
+import inspect
 import io
-import base64
 import os
+import pickle
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import repeat
 from pathlib import Path
-from typing import Callable, List, Optional, Union
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 from PIL import Image, ImageOps
+from scipy.ndimage import find_objects
 from tqdm import tqdm
 from skimage.measure import regionprops_table
 
+try:
+    # SIMD-accelerated, drop-in replacement for the standard library encoder
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
 
 THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", 64))
 
+THUMBNAIL_RESAMPLE = Image.Resampling[
+    os.getenv("THUMBNAIL_RESAMPLE", "BILINEAR").upper()
+]
+
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "JPEG").upper()
+
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+
+THUMBNAIL_PNG_COMPRESS_LEVEL = int(os.getenv("THUMBNAIL_PNG_COMPRESS_LEVEL", 1))
+
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 1))
+
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 2))
+
 VALID_IMAGE_FORMATS = ["tif", "tiff", "png", "jpeg", "jpg"]
 
+_VALID_IMAGE_EXTENSIONS = frozenset(VALID_IMAGE_FORMATS)
+
+# Image modes that can be shrunk before the conversion to RGB. Others are converted first: 16-bit and float
+# images cannot be reduced, and 1-bit and palette images would be resized with NEAREST whatever the filter.
+_RESIZABLE_IMAGE_MODES = frozenset(["L", "LA", "RGB", "RGBA"])
+
+_THREAD_LOCAL = threading.local()
+
 
 def _load_image(image_file: Union[Path, str]) -> Image.Image:
     """Load an image using Pillow."""
@@ -30,12 +67,17 @@ def _load_image(image_file: Union[Path, str]) -> Image.Image:
 
 
 def _letterbox_resize(pil_image: Image.Image) -> Image.Image:
-    """Resize a PIL image to a square thumbnail in letterbox style (with black margins)."""
-    pil_image = pil_image.convert("RGB")
+    """Resize a PIL image to a square thumbnail in letterbox style (with black margins).
+    The image is first shrunk in place, so that the conversion to RGB and the padding only touch thumbnail-sized data.
+    Callers must therefore be done with the full-size image (saved, converted to an array...) before calling this function.
+    """
+    if pil_image.mode not in _RESIZABLE_IMAGE_MODES:
+        pil_image = pil_image.convert("RGB")
+    pil_image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), THUMBNAIL_RESAMPLE)
     thumbnail = ImageOps.pad(
-        pil_image,
+        pil_image.convert("RGB"),
         size=(THUMBNAIL_SIZE, THUMBNAIL_SIZE),
-        method=Image.Resampling.LANCZOS,
+        method=THUMBNAIL_RESAMPLE,
         color=(0, 0, 0),
         centering=(0.5, 0.5),
     )
@@ -43,14 +85,40 @@ def _letterbox_resize(pil_image: Image.Image) -> Image.Image:
     return thumbnail
 
 
+@contextmanager
+def _thumbnail_buffer() -> Iterator[io.BytesIO]:
+    """Provide an empty in-memory buffer for encoding thumbnails, reused across calls in the same thread."""
+    buffer = getattr(_THREAD_LOCAL, "buffer", None)
+    if buffer is None:
+        buffer = _THREAD_LOCAL.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    yield buffer
+
+
+def _thumbnail_save_kwargs() -> Dict:
+    """Encoder options for saving thumbnails in THUMBNAIL_FORMAT."""
+    if THUMBNAIL_FORMAT == "PNG":
+        return {"format": "PNG", "compress_level": THUMBNAIL_PNG_COMPRESS_LEVEL}
+    if THUMBNAIL_FORMAT == "WEBP":
+        return {"format": "WEBP", "quality": THUMBNAIL_QUALITY, "method": 0}
+    if THUMBNAIL_FORMAT in ("JPEG", "JPG"):
+        return {"format": "JPEG", "quality": THUMBNAIL_QUALITY, "optimize": False}
+    raise ValueError(
+        f"Unsupported thumbnail format: {THUMBNAIL_FORMAT} (use JPEG, PNG or WEBP)."
+    )
+
+
 def _encode_thumbnail(pil_image: Image.Image) -> str:
-    """Compute an image thumbnail (preserve aspect ratio) and encode it to bytes for saving in a dataframe."""
+    """Compute an image thumbnail (preserve aspect ratio) and encode it to bytes for saving in a dataframe.
+    Note: `pil_image` is shrunk in place (see `_letterbox_resize`).
+    """
     thumbnail = _letterbox_resize(pil_image)
     # Encode the thumbnail and store it in the CSV
-    output = io.BytesIO()
-    thumbnail.save(output, format="png")
-    thumbnail_data = output.getvalue()
-    encoded_thumbnail = base64.b64encode(thumbnail_data).decode("utf-8")
+    with _thumbnail_buffer() as output:
+        thumbnail.save(output, **_thumbnail_save_kwargs())
+        with output.getbuffer() as thumbnail_data:
+            encoded_thumbnail = b64encode(thumbnail_data).decode("ascii")
 
     return encoded_thumbnail
 
@@ -62,41 +130,49 @@ def _normalize_numeric_columns(
     We use a min-max normalization and reduce the range of output values by a small margin. The effective output range is given by [margin_rel/2, 1-margin_rel/2].
     The output range determines how spread out data points are along the width/height of the canvas in the web app.
     """
-    df_normed = df.copy()
-
-    # Select only numeric columns to normalize
-    numeric_cols = df_normed.select_dtypes(include=[np.number]).columns
-    if len(numeric_cols) == 0:
-        return df_normed
-
-    mins = df_normed[numeric_cols].min()
-    maxs = df_normed[numeric_cols].max()
-    ranges = maxs - mins
-
-    # to avoid division by zero:
-    ranges = ranges.replace(0, 1)
-
-    df_normed[numeric_cols] = (df_normed[numeric_cols] - mins) / ranges
-
-    # Extra relative "margin"
-    df_normed[numeric_cols] = df_normed[numeric_cols] * (1 - margin_rel)
-    df_normed[numeric_cols] = df_normed[numeric_cols] + (margin_rel / 2)
-
-    # Add the image ID
-    df_normed["id"] = df_normed.index
-
-    # Keep only numeric columns + thumbnail and image_file columns
-    numeric_cols = df_normed.select_dtypes(include=[np.number]).columns
-    df_normed_numeric = df_normed[numeric_cols].copy()
-    df_normed_numeric["thumbnail"] = df_normed["thumbnail"]
-    df_normed_numeric["image_file"] = df_normed["image_file"]
-
-    return df_normed_numeric
+    # Select only numeric columns to normalize (once: the output is built from this selection)
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    # Work on a single float64 block rather than the whole DataFrame
+    arr = df[numeric_cols].to_numpy(dtype=np.float64, copy=True)
+    if arr.size > 0:
+        # All-NaN features give NaN (like pandas' min/max) without a warning
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mins = np.nanmin(arr, axis=0)
+            ranges = np.nanmax(arr, axis=0) - mins
+
+        # to avoid division by zero:
+        ranges[ranges == 0] = 1
+
+        # Min-max normalization and extra relative "margin", fused into one affine transform
+        np.subtract(arr, mins, out=arr)
+        np.multiply(arr, (1 - margin_rel) / ranges, out=arr)
+        np.add(arr, margin_rel / 2, out=arr)
+
+    # Keep only numeric columns + image ID, thumbnail and image_file columns
+    df_normed = pd.DataFrame(arr, columns=numeric_cols, index=df.index)
+    df_normed["id"] = np.arange(len(df), dtype=np.int32)
+    df_normed["thumbnail"] = df["thumbnail"]
+    df_normed["image_file"] = df["image_file"]
+
+    return df_normed
+
+
+def _join_records(df: pd.DataFrame, records: List[Dict]) -> pd.DataFrame:
+    """Add the measurements of a list of records (one dict per row) as columns of the dataframe, in a single pass.
+    Measurements with the same name as an existing column replace it; keys missing from some records give NaN values.
+    """
+    records_df = pd.DataFrame.from_records(records, index=df.index)
+    df = df.drop(columns=records_df.columns, errors="ignore")
+    return pd.concat([df, records_df], axis=1)
 
 
 def _save_csv(df: pd.DataFrame, images_path: Path) -> Path:
     """Save the features dataframe as a CSV file."""
     csv_path = images_path / "features.csv"
+    # Never stringify the image crops arrays into the CSV
+    df = df.drop(columns=["image_intensity"], errors="ignore")
     df.to_csv(csv_path)
     print(f"✅ Saved: {csv_path.resolve()}")
     return csv_path
@@ -114,19 +190,135 @@ def _setup_images_path(
         os.mkdir(images_path)
         print(f"ℹ️ Created: {images_path}")
     if ensure_empty:
-        existing_image_files = []
-        for ext in VALID_IMAGE_FORMATS:
-            existing_image_files.extend(images_path.glob(f"*.{ext}"))
-        if len(existing_image_files) > 0:
+        if len(_get_image_files(images_path)) > 0:
             raise RuntimeError(f"Images directory is not empty! ({images_path}).")
     return images_path
 
 
 def _get_image_files(images_path: Path) -> List[Path]:
-    image_files = []
-    for ext in VALID_IMAGE_FORMATS:
-        image_files.extend(images_path.glob(f"*.{ext}"))
-    return image_files
+    """List the image files in a directory in a single pass over its entries."""
+    with os.scandir(images_path) as entries:
+        return [
+            Path(entry.path)
+            for entry in entries
+            if os.path.splitext(entry.name)[1][1:].lower() in _VALID_IMAGE_EXTENSIONS
+            and entry.is_file()
+        ]
+
+
+def _crop_objects(
+    label_image: np.ndarray, image: np.ndarray, labels: np.ndarray
+) -> np.ndarray:
+    """Crop the image under the mask of each label, like the `image_intensity` property of regionprops.
+    The bounding boxes of all objects are found in a single pass over the label image with scipy's `find_objects`.
+    """
+    slices = find_objects(label_image)
+    crops = np.empty(len(labels), dtype=object)
+    for idx, label in enumerate(labels):
+        bbox = slices[label - 1]
+        mask = label_image[bbox] == label
+        if image.ndim > label_image.ndim:
+            mask = mask[..., np.newaxis]
+        crops[idx] = image[bbox] * mask
+    return crops
+
+
+def _save_and_thumb(idx: int, arr: np.ndarray, prefix: str) -> Tuple[str, Path]:
+    """Save an image array as a numbered PNG file in the `prefix` directory and compute its encoded thumbnail."""
+    pil_image = Image.fromarray(arr)
+    image_file = os.path.join(prefix, f"{idx:03d}.png")
+    pil_image.save(image_file)
+    return _encode_thumbnail(pil_image), Path(image_file)
+
+
+def _save_images_and_thumbnails(
+    arrs: Sequence[np.ndarray], images_path: Path
+) -> Tuple[List[str], List[Path]]:
+    """Save image arrays and compute their thumbnails in a thread pool (PIL releases the GIL while encoding)."""
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        results = list(
+            executor.map(
+                _save_and_thumb, range(len(arrs)), arrs, repeat(str(images_path))
+            )
+        )
+    if len(results) == 0:
+        return [], []
+    encoded_thumbnails, image_files = zip(*results)
+    return list(encoded_thumbnails), list(image_files)
+
+
+def _is_picklable(*objs) -> bool:
+    """Check whether objects can be sent to worker processes."""
+    try:
+        pickle.dumps(objs)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _load_image_data(image_file: Path) -> Image.Image:
+    """Load an image and decode its pixel data (Pillow decodes lazily otherwise)."""
+    pil_image = _load_image(image_file)
+    pil_image.load()
+    return pil_image
+
+
+def _prefetch(func: Callable, items: Sequence, depth: int) -> Iterator:
+    """Apply `func` to the items in background threads, keeping at most `depth` calls in flight, and yield the results in order."""
+    depth = max(1, depth)
+    with ThreadPoolExecutor(max_workers=depth) as executor:
+        futures = deque()
+        for item in items:
+            futures.append(executor.submit(func, item))
+            if len(futures) >= depth:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def _validate_featurizer(featurizer_func: Callable, featurizer_kwargs: Dict) -> None:
+    """Check once, before processing any image, that the featurizer can be called with an image and the extra keyword arguments."""
+    try:
+        signature = inspect.signature(featurizer_func)
+    except (TypeError, ValueError):
+        return  # Some callables (e.g. builtins) have no inspectable signature
+    try:
+        signature.bind(None, **featurizer_kwargs)
+    except TypeError as e:
+        raise TypeError(
+            f"The featurizer function must take an `image` NumPy array as first argument (and the extra keyword arguments: {list(featurizer_kwargs)}): {e}"
+        ) from e
+
+
+def _run_featurizer(
+    featurizer_func: Callable, image: np.ndarray, featurizer_kwargs: Dict
+) -> Dict:
+    """Apply the featurizer to an image and check that it returns a dictionary of features."""
+    measurements = featurizer_func(image, **featurizer_kwargs)
+    if not isinstance(measurements, dict):
+        raise TypeError(
+            f"The featurizer function must return a dictionary, not {type(measurements).__name__}."
+        )
+    return measurements
+
+
+def _featurize_image(
+    pil_image: Image.Image, featurizer_func: Callable, featurizer_kwargs: Dict
+) -> Dict:
+    """Run the featurizer on a loaded image and add its encoded thumbnail to the measurements."""
+    image_arr = np.asarray(pil_image)
+    measurements = _run_featurizer(featurizer_func, image_arr, featurizer_kwargs)
+    measurements["thumbnail"] = _encode_thumbnail(pil_image)
+    return measurements
+
+
+def _process_one(
+    image_file: Path, featurizer_func: Callable, featurizer_kwargs: Dict
+) -> Dict:
+    """Load an image, run the featurizer on it and add its encoded thumbnail to the measurements."""
+    return _featurize_image(
+        _load_image_data(image_file), featurizer_func, featurizer_kwargs
+    )
 
 
 def apply_to_images(
@@ -162,6 +354,8 @@ def apply_to_images(
     ==========
     - The path to the saved CSV file.
     """
+    _validate_featurizer(featurizer_func, featurizer_kwargs)
+
     images_path = _setup_images_path(images_dir)
 
     image_files = _get_image_files(images_path)
@@ -169,20 +363,43 @@ def apply_to_images(
         print(f"⚠️ No images files in this directory: {images_path}.")
         return
 
-    # Run the featurizer on all image files
+    # Run the featurizer on all image files (in parallel worker processes if possible)
     df = pd.DataFrame({"image_file": image_files})
-    records = []
-    for image_file in tqdm(
-        image_files, total=len(image_files), desc="Applying featurizer"
-    ):
-        pil_image = _load_image(image_file)
-        image_arr = np.asarray(pil_image)
-        measurements = featurizer_func(image_arr, **featurizer_kwargs)
-        measurements["thumbnail"] = _encode_thumbnail(pil_image)
-        records.append(measurements)
+    use_processes = MAX_WORKERS > 1 and len(image_files) > 1
+    if use_processes and not _is_picklable(featurizer_func, featurizer_kwargs):
+        print(
+            "ℹ️ The featurizer function cannot be sent to worker processes (e.g. it is a lambda or nested function). Running it in the current process."
+        )
+        use_processes = False
+    if use_processes:
+        chunksize = max(1, len(image_files) // (4 * MAX_WORKERS))
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            records = list(
+                tqdm(
+                    executor.map(
+                        partial(
+                            _process_one,
+                            featurizer_func=featurizer_func,
+                            featurizer_kwargs=featurizer_kwargs,
+                        ),
+                        image_files,
+                        chunksize=chunksize,
+                    ),
+                    total=len(image_files),
+                    desc="Applying featurizer",
+                )
+            )
+    else:
+        # Decode the next images in background threads while the featurizer runs
+        pil_images = _prefetch(_load_image_data, image_files, PREFETCH_DEPTH)
+        records = [
+            _featurize_image(pil_image, featurizer_func, featurizer_kwargs)
+            for pil_image in tqdm(
+                pil_images, total=len(image_files), desc="Applying featurizer"
+            )
+        ]
 
-    for key in list(records[0].keys()):
-        df[key] = [record[key] for record in records]
+    df = _join_records(df, records)
 
     # Normalize and save dataframe
     df_normed = _normalize_numeric_columns(df)
@@ -212,6 +429,9 @@ def apply_to_label_image(
     ==========
     - The path to the saved CSV file.
     """
+    if featurizer_func:
+        _validate_featurizer(featurizer_func, featurizer_kwargs)
+
     images_path = _setup_images_path(images_dir, ensure_empty=True)
 
     # Make sure `label` and `image_intensity` are among the properties
@@ -235,24 +455,28 @@ def apply_to_label_image(
         )
     )
 
+    # Save the images, compute thumbnails
+    image_rois = df["image_intensity"].to_numpy()
+    encoded_thumbnails, image_files = _save_images_and_thumbnails(
+        image_rois, images_path
+    )
+
     # Apply the featurizer function
     records = []
-    for idx, image_roi in enumerate(df["image_intensity"].values):
-        pil_image = Image.fromarray(image_roi)
-        image_arr = np.asarray(pil_image)
-        image_file = images_path / f"{idx:03d}.png"
-        pil_image.save(image_file)
+    for image_roi, thumbnail, image_file in zip(
+        image_rois, encoded_thumbnails, image_files
+    ):
         measurements = {}
         if featurizer_func:
-            measurements = measurements | featurizer_func(
-                image_arr, **featurizer_kwargs
+            # The regionprops crop is already a NumPy array: no need for a PIL round-trip
+            measurements = measurements | _run_featurizer(
+                featurizer_func, image_roi, featurizer_kwargs
             )
-        measurements["thumbnail"] = _encode_thumbnail(pil_image)
+        measurements["thumbnail"] = thumbnail
         measurements["image_file"] = image_file
         records.append(measurements)
 
-    for key in list(records[0].keys()):
-        df[key] = [record[key] for record in records]
+    df = _join_records(df, records)
 
     # Normalize and save dataframe
     df_normed = _normalize_numeric_columns(df)
@@ -295,10 +519,11 @@ def apply_from_images_df(
                 print(
                     "⚠️ The provided `image_column` will be ignored because a `filename_column` was passed."
                 )
+            image_files_set = frozenset(image_files)
             image_paths = []
-            for file_name in df[filename_column].values:
+            for file_name in df[filename_column].to_numpy():
                 file_path = images_path / file_name
-                if not file_path in image_files:
+                if file_path not in image_files_set:
                     raise RuntimeError(
                         f"{file_path.name} is not in the images directory ({images_path})."
                     )
@@ -322,14 +547,13 @@ def apply_from_images_df(
                 "⚠️ The provided `filename_column` will be ignored because an `image_column` was passed."
             )
 
-        n_files = len(df[image_column].values)
+        # Resolve the output directory once rather than once per file
+        prefix = str(images_path.resolve())
+        arrs = df[image_column].to_numpy()
         df["image_file"] = [
-            str((images_path / f"{idx:03d}.png").resolve())
-            for idx in range(n_files)
-        ]
-        pil_images: List[Image.Image] = [
-            Image.fromarray(arr) for arr in df[image_column].values
+            os.path.join(prefix, f"{idx:03d}.png") for idx in range(len(arrs))
         ]
+        pil_images: List[Image.Image] = [Image.fromarray(arr) for arr in arrs]
         for pil_image, image_file in zip(pil_images, df["image_file"].values):
             pil_image.save(image_file)
 
@@ -368,43 +592,48 @@ def apply_from_label_image_df(
         raise RuntimeError("DataFrame should have a `label` column.")
     else:
         uniques = np.unique(label_image)
-        uniques = uniques[uniques != 0].tolist()
-        label_values: np.ndarray = df["label"].values
+        uniques = uniques[uniques != 0]
+        label_values: np.ndarray = df["label"].to_numpy()
         uniques_df = np.unique(label_values)
-        uniques_df = uniques_df[uniques_df != 0].tolist()
+        uniques_df = uniques_df[uniques_df != 0]
         if len(uniques) != len(uniques_df):
             raise RuntimeError(
                 "Labels in dataframe don't match labels in `label_image`."
             )
-        for v in df["label"].values:
-            if v not in uniques:
-                raise RuntimeError(
-                    "Labels in dataframe don't match labels in `label_image`."
-                )
+        if not np.isin(label_values, uniques).all():
+            raise RuntimeError(
+                "Labels in dataframe don't match labels in `label_image`."
+            )
 
     # Add `image_intensity` if it's not already there
     if "image_intensity" not in df.columns:
         image_ = (
             (label_image > 0).astype(np.uint8) * 255 if image is None else image
         )
-        df_ = pd.DataFrame(
-            regionprops_table(
-                label_image,
-                intensity_image=image_,
-                properties=["label", "image_intensity"],
+        # Crop the objects directly when labels can index the `find_objects` slices
+        if (
+            np.issubdtype(label_image.dtype, np.integer)
+            and np.issubdtype(label_values.dtype, np.integer)
+            and label_values.size > 0
+            and label_values.min() > 0
+        ):
+            df = df.assign(
+                image_intensity=_crop_objects(label_image, image_, label_values)
             )
-        )
-        df = df.merge(df_, on="label")
+        else:
+            df_ = pd.DataFrame(
+                regionprops_table(
+                    label_image,
+                    intensity_image=image_,
+                    properties=["label", "image_intensity"],
+                )
+            )
+            df = df.merge(df_, on="label")
 
     # Save the images, compute thumbnails
-    image_files = []
-    encoded_thumbnails = []
-    for idx, image_intensity in enumerate(df["image_intensity"].values):
-        pil_image = Image.fromarray(image_intensity)
-        image_file = images_path / f"{idx:03d}.png"
-        pil_image.save(image_file)
-        encoded_thumbnails.append(_encode_thumbnail(pil_image))
-        image_files.append(image_file)
+    encoded_thumbnails, image_files = _save_images_and_thumbnails(
+        df["image_intensity"].to_numpy(), images_path
+    )
     # Add an encoded thumbnail and image_path to the dataframe.
     df["thumbnail"] = encoded_thumbnails
     df["image_file"] = image_files
@@ -0,0 +1,103 @@
+import pytest
+import tempfile
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+
+from featurescope import apply_from_images_df
+
+
+# ============================================================================
+# FIXTURES: Setup and Teardown
+# ============================================================================
+
+
+@pytest.fixture
+def temp_images_dir():
+    """Create a temporary directory for test images."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def images_dir_with_samples(temp_images_dir):
+    """Create a directory with 3 sample test images."""
+    for i in range(3):
+        img_array = np.full((32, 32), fill_value=50 + i * 30, dtype=np.uint8)
+        img = Image.fromarray(img_array, mode="L")
+        img.save(Path(temp_images_dir) / f"test_{i}.png")
+    return temp_images_dir
+
+
+@pytest.fixture
+def filenames_df():
+    """Create a features dataframe matching the sample images by file name."""
+    return pd.DataFrame(
+        {
+            "file_name": [f"test_{i}.png" for i in range(3)],
+            "feature_01": [1.2, 1.9, 2.3],
+        }
+    )
+
+
+@pytest.fixture
+def arrays_df():
+    """Create a features dataframe with images stored as NumPy arrays."""
+    return pd.DataFrame(
+        {
+            "image": [
+                np.full((32, 16), fill_value=50 + i * 30, dtype=np.uint8)
+                for i in range(3)
+            ],
+            "feature_01": [1.2, 1.9, 2.3],
+        }
+    )
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+
+def test_apply_from_images_df_filename_column(images_dir_with_samples, filenames_df):
+    """Test that rows are matched with image files via `filename_column`."""
+    csv_path = apply_from_images_df(
+        filenames_df, images_dir_with_samples, filename_column="file_name"
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert [Path(f).name for f in df["image_file"]] == list(filenames_df["file_name"])
+
+
+def test_apply_from_images_df_missing_file(images_dir_with_samples, filenames_df):
+    """Test that a file name absent from the images directory raises RuntimeError."""
+    filenames_df.loc[1, "file_name"] = "missing.png"
+    with pytest.raises(RuntimeError):
+        apply_from_images_df(
+            filenames_df, images_dir_with_samples, filename_column="file_name"
+        )
+
+
+def test_apply_from_images_df_image_column(temp_images_dir, arrays_df):
+    """Test that images stored in `image_column` are saved in the empty images directory."""
+    csv_path = apply_from_images_df(arrays_df, temp_images_dir, image_column="image")
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert len(list(Path(temp_images_dir).glob("*.png"))) == 3
+    assert "image" not in df.columns
+
+
+def test_apply_from_images_df_custom_index(images_dir_with_samples, filenames_df):
+    """Test that the `id` column is a range of integers even when the dataframe has a custom index."""
+    filenames_df.index = ["a", "b", "c"]
+    csv_path = apply_from_images_df(
+        filenames_df, images_dir_with_samples, filename_column="file_name"
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert list(df["id"]) == [0, 1, 2]
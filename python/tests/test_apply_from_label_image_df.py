@@ -0,0 +1,153 @@
+import base64
+import io
+import pytest
+import tempfile
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+
+from featurescope import apply_from_label_image_df
+
+
+# ============================================================================
+# FIXTURES: Setup and Teardown
+# ============================================================================
+
+
+@pytest.fixture
+def temp_images_dir():
+    """Create a temporary directory for the results."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def label_image():
+    """Create a labelled image with 3 rectangular objects of different sizes."""
+    label_image = np.zeros((64, 64), dtype=np.int32)
+    label_image[2:10, 2:12] = 1
+    label_image[20:40, 5:15] = 2
+    label_image[45:60, 30:62] = 3
+    return label_image
+
+
+@pytest.fixture
+def intensity_image():
+    """Create an intensity image with a horizontal gradient."""
+    return np.tile(np.arange(64, dtype=np.uint8) * 4, (64, 1))
+
+
+@pytest.fixture
+def features_df():
+    """Create a features dataframe matching the labels of `label_image`."""
+    return pd.DataFrame(
+        {
+            "label": [1, 2, 3],
+            "feature_01": [1.2, 1.9, 2.3],
+            "feature_02": [4, 3, 0],
+        }
+    )
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+
+def test_apply_from_label_image_df_saves_crops(
+    temp_images_dir, label_image, features_df
+):
+    """Test that one image is saved per object and the CSV has one row per object."""
+    csv_path = apply_from_label_image_df(features_df, temp_images_dir, label_image)
+
+    assert csv_path.exists()
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert {"id", "thumbnail", "image_file", "feature_01", "feature_02"}.issubset(
+        df.columns
+    )
+    assert "image_intensity" not in df.columns
+    assert len(list(Path(temp_images_dir).glob("*.png"))) == 3
+
+
+def test_apply_from_label_image_df_with_intensity_image(
+    temp_images_dir, label_image, intensity_image, features_df
+):
+    """Test that the saved crops match the intensity image under each object's mask."""
+    csv_path = apply_from_label_image_df(
+        features_df, temp_images_dir, label_image, intensity_image
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    crop = np.asarray(Image.open(df["image_file"].iloc[1]))
+    np.testing.assert_array_equal(crop, intensity_image[20:40, 5:15])
+
+
+def test_apply_from_label_image_df_missing_label_column(
+    temp_images_dir, label_image, features_df
+):
+    """Test that a dataframe without a `label` column raises RuntimeError."""
+    with pytest.raises(RuntimeError):
+        apply_from_label_image_df(
+            features_df.drop(columns="label"), temp_images_dir, label_image
+        )
+
+
+def test_apply_from_label_image_df_mismatched_labels(
+    temp_images_dir, label_image, features_df
+):
+    """Test that labels absent from `label_image` raise RuntimeError."""
+    features_df["label"] = [1, 2, 4]
+    with pytest.raises(RuntimeError):
+        apply_from_label_image_df(features_df, temp_images_dir, label_image)
+
+
+def test_apply_from_label_image_df_thumbnails(
+    temp_images_dir, label_image, intensity_image, features_df
+):
+    """Test that crops smaller than the thumbnail size are upscaled to a letterboxed thumbnail."""
+    from featurescope.featurizer import THUMBNAIL_SIZE
+
+    csv_path = apply_from_label_image_df(
+        features_df, temp_images_dir, label_image, intensity_image
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    for thumb, image_file in zip(df["thumbnail"], df["image_file"]):
+        thumbnail = np.asarray(Image.open(io.BytesIO(base64.b64decode(thumb))))
+        assert thumbnail.shape == (THUMBNAIL_SIZE, THUMBNAIL_SIZE, 3)
+        # The saved crop keeps its original (full) size
+        crop = np.asarray(Image.open(image_file))
+        assert max(crop.shape) < THUMBNAIL_SIZE
+
+    # The 20x10 crop of object 2 is letterboxed: black margins left and right
+    thumbnail = np.asarray(
+        Image.open(io.BytesIO(base64.b64decode(df["thumbnail"].iloc[1])))
+    )
+    assert thumbnail[:, :8].max() < 20
+    assert thumbnail[:, -8:].max() < 20
+    assert thumbnail[:, 24:40].mean() > 20
+
+
+def test_apply_from_label_image_df_does_not_modify_input(
+    temp_images_dir, label_image, features_df
+):
+    """Test that the input dataframe is left unchanged."""
+    columns = list(features_df.columns)
+    apply_from_label_image_df(features_df, temp_images_dir, label_image)
+
+    assert list(features_df.columns) == columns
+
+
+def test_apply_from_label_image_df_empty(temp_images_dir):
+    """Test that an empty dataframe and a label image without objects give an empty CSV."""
+    df = pd.DataFrame({"label": pd.Series([], dtype=np.int32), "feature_01": []})
+    csv_path = apply_from_label_image_df(
+        df, temp_images_dir, np.zeros((16, 16), dtype=np.int32)
+    )
+
+    assert csv_path.exists()
+    assert len(pd.read_csv(csv_path, index_col=0)) == 0
@@ -3,9 +3,12 @@ AI disclosure:
 This test suite was generated with Claude Haiku 4.5 from a draft and detailed prompt instructions.
 """
 
+import base64
+import io
 import pytest
 import tempfile
 import shutil
+import warnings
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -85,6 +88,14 @@ def mixed_type_featurizer(image: np.ndarray) -> Dict:
     }
 
 
+def bright_only_featurizer(image: np.ndarray) -> Dict:
+    """Featurizer returning an extra feature for bright images only."""
+    features = {"mean": float(image.mean())}
+    if image.mean() > 100:
+        features["bright_mean"] = float(image.mean())
+    return features
+
+
 def empty_dict_featurizer(image: np.ndarray) -> Dict:
     """Featurizer returning empty dictionary."""
     return {}
@@ -282,3 +293,146 @@ def test_apply_to_images_creates_dataset_csv(images_dir_with_samples):
 
     assert csv_path.name == "features.csv"
     assert csv_path.parent == Path(images_dir_with_samples)
+
+
+def test_apply_to_images_parallel_matches_serial(images_dir_with_samples, monkeypatch):
+    """Test that running the featurizer in worker processes gives the same CSV as running it serially."""
+    monkeypatch.setattr("featurescope.featurizer.MAX_WORKERS", 1)
+    csv_path = apply_to_images(
+        images_dir=images_dir_with_samples,
+        featurizer_func=minmax_featurizer,
+    )
+    df_serial = pd.read_csv(csv_path, index_col=0)
+
+    monkeypatch.setattr("featurescope.featurizer.MAX_WORKERS", 2)
+    csv_path = apply_to_images(
+        images_dir=images_dir_with_samples,
+        featurizer_func=minmax_featurizer,
+    )
+    df_parallel = pd.read_csv(csv_path, index_col=0)
+
+    pd.testing.assert_frame_equal(df_serial, df_parallel)
+
+
+def test_apply_to_images_thumbnail_decodable(images_dir_with_samples):
+    """Test that thumbnails decode to square images of the thumbnail size."""
+    from featurescope.featurizer import THUMBNAIL_SIZE
+
+    csv_path = apply_to_images(
+        images_dir=images_dir_with_samples,
+        featurizer_func=minmax_featurizer,
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+
+    for thumb in df["thumbnail"]:
+        img = Image.open(io.BytesIO(base64.b64decode(thumb)))
+        assert img.size == (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+
+
+def test_apply_to_images_parallel_unpicklable_featurizer(
+    images_dir_with_samples, monkeypatch
+):
+    """Test that a featurizer that cannot be sent to worker processes runs in the current process."""
+    monkeypatch.setattr("featurescope.featurizer.MAX_WORKERS", 2)
+    csv_path = apply_to_images(
+        images_dir=images_dir_with_samples,
+        featurizer_func=lambda image: {"mean": float(image.mean())},
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert "mean" in df.columns
+
+
+def test_normalize_numeric_columns_large_values():
+    """Test that normalization keeps the precision of large values and maps them to the margin range."""
+    from featurescope.featurizer import _normalize_numeric_columns
+
+    df = pd.DataFrame(
+        {
+            "a": [1_000_000_001, 1_000_000_002, 1_000_000_003],
+            "b": [5.0, 5.0, 5.0],
+            "thumbnail": ["", "", ""],
+            "image_file": ["x.png", "y.png", "z.png"],
+        }
+    )
+    df_normed = _normalize_numeric_columns(df, margin_rel=0.2)
+
+    np.testing.assert_allclose(df_normed["a"], [0.1, 0.5, 0.9])
+    np.testing.assert_allclose(df_normed["b"], [0.1, 0.1, 0.1])
+    assert list(df_normed["id"]) == [0, 1, 2]
+
+
+def test_apply_to_images_records_with_different_keys(images_dir_with_samples):
+    """Test that features missing from some images are saved as empty values."""
+    csv_path = apply_to_images(
+        images_dir=images_dir_with_samples,
+        featurizer_func=bright_only_featurizer,
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert "mean" in df.columns
+    assert "bright_mean" in df.columns
+    assert df["bright_mean"].isna().sum() == 2
+
+
+def test_normalize_numeric_columns_no_numeric_columns():
+    """Test that a dataframe without numeric features keeps only the id, thumbnail and image_file columns."""
+    from featurescope.featurizer import _normalize_numeric_columns
+
+    df = pd.DataFrame(
+        {
+            "text_val": ["a", "b"],
+            "thumbnail": ["", ""],
+            "image_file": ["x.png", "y.png"],
+        }
+    )
+    df_normed = _normalize_numeric_columns(df)
+
+    assert list(df_normed.columns) == ["id", "thumbnail", "image_file"]
+
+
+def test_apply_to_images_invalid_featurizer_kwargs(images_dir_with_samples):
+    """Test that unexpected featurizer kwargs raise TypeError before any image is processed."""
+    with pytest.raises(TypeError):
+        apply_to_images(
+            images_dir=images_dir_with_samples,
+            featurizer_func=minmax_featurizer,
+            threshold=60,
+        )
+    assert not (Path(images_dir_with_samples) / "features.csv").exists()
+
+
+@pytest.mark.parametrize("mode", ["1", "P"])
+def test_letterbox_resize_fine_pattern(mode):
+    """Test that 1-bit and palette images are smoothed (not decimated) when shrunk to a thumbnail."""
+    from featurescope.featurizer import _letterbox_resize
+
+    checkerboard = (np.indices((1024, 1024)).sum(axis=0) % 2 * 255).astype(np.uint8)
+    pil_image = Image.fromarray(checkerboard, mode="L").convert(mode)
+
+    thumbnail = np.asarray(_letterbox_resize(pil_image))
+
+    assert 100 < thumbnail.mean() < 155
+
+
+def test_normalize_numeric_columns_all_nan_column():
+    """Test that an all-NaN feature stays NaN without warnings and other features are normalized."""
+    from featurescope.featurizer import _normalize_numeric_columns
+
+    df = pd.DataFrame(
+        {
+            "a": [1.0, 2.0, 3.0],
+            "nan_feature": [np.nan, np.nan, np.nan],
+            "thumbnail": ["", "", ""],
+            "image_file": ["x.png", "y.png", "z.png"],
+        }
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        df_normed = _normalize_numeric_columns(df)
+
+    np.testing.assert_allclose(df_normed["a"], [0.1, 0.5, 0.9])
+    assert df_normed["nan_feature"].isna().all()
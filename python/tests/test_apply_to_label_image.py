@@ -0,0 +1,95 @@
+import pytest
+import tempfile
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict
+
+from featurescope import apply_to_label_image
+
+
+# ============================================================================
+# FIXTURES: Setup and Teardown
+# ============================================================================
+
+
+@pytest.fixture
+def temp_images_dir():
+    """Create a temporary directory for the results."""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def label_image():
+    """Create a labelled image with 3 rectangular objects of different sizes."""
+    label_image = np.zeros((64, 64), dtype=np.int32)
+    label_image[2:10, 2:12] = 1
+    label_image[20:40, 5:15] = 2
+    label_image[45:60, 30:62] = 3
+    return label_image
+
+
+@pytest.fixture
+def intensity_image():
+    """Create an intensity image with a horizontal gradient."""
+    return np.tile(np.arange(64, dtype=np.uint8) * 4, (64, 1))
+
+
+# ============================================================================
+# FEATURIZER FUNCTIONS
+# ============================================================================
+
+
+def shape_featurizer(image: np.ndarray) -> Dict:
+    """Featurizer returning the crop dimensions and mean value."""
+    assert isinstance(image, np.ndarray)
+    return {
+        "height": image.shape[0],
+        "width": image.shape[1],
+        "mean": float(image.mean()),
+    }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+
+def test_apply_to_label_image_properties(temp_images_dir, label_image):
+    """Test that regionprops properties are computed for each object."""
+    csv_path = apply_to_label_image(
+        temp_images_dir, label_image, properties=["area", "eccentricity"]
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert len(df) == 3
+    assert {"area", "eccentricity", "label", "thumbnail", "image_file"}.issubset(
+        df.columns
+    )
+    assert "image_intensity" not in df.columns
+    assert len(list(Path(temp_images_dir).glob("*.png"))) == 3
+
+
+def test_apply_to_label_image_featurizer(temp_images_dir, label_image, intensity_image):
+    """Test that the featurizer is applied to the intensity crop of each object."""
+    csv_path = apply_to_label_image(
+        temp_images_dir,
+        label_image,
+        image=intensity_image,
+        featurizer_func=shape_featurizer,
+    )
+
+    df = pd.read_csv(csv_path, index_col=0)
+    assert {"height", "width", "mean"}.issubset(df.columns)
+    # Normalized values keep the ordering of the raw crop heights (8, 20, 15)
+    assert list(np.argsort(df["height"].to_numpy())) == [0, 2, 1]
+
+
+def test_apply_to_label_image_not_empty_dir(temp_images_dir, label_image):
+    """Test that a directory already containing images raises RuntimeError."""
+    apply_to_label_image(temp_images_dir, label_image)
+    with pytest.raises(RuntimeError):
+        apply_to_label_image(temp_images_dir, label_image)
@@ -1,6 +1,15 @@
 import "./point.css";
 import { Component } from "react";
 
+// Thumbnails may be encoded as JPEG, PNG or WebP: detect the format from the
+// first bytes of the base64 data.
+const thumbnailMimeType = (thumbnail) => {
+  const data = String(thumbnail);
+  if (data.startsWith("/9j/")) return "image/jpeg";
+  if (data.startsWith("UklGR")) return "image/webp";
+  return "image/png";
+};
+
 class Point extends Component {
   handleMouseEnter = (e) => {
     const { id, yPos, xPos, size, actionFnct } = this.props;
@@ -30,7 +39,7 @@ class Point extends Component {
 
   render = () => {
     const { yPos, xPos, size, thumbnail } = this.props;
-    const imageUrl = `data:image/png;base64,${thumbnail}`;
+    const imageUrl = `data:${thumbnailMimeType(thumbnail)};base64,${thumbnail}`;
     return (
       <div
         className="point"